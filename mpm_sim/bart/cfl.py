@@ -30,13 +30,17 @@ def readcfl(name):
     return a.reshape(dims, order='F')  # column-major
 
 
-def writecfl(name, array):
+def writecfl_header(name, shape):
     h = open(name + ".hdr", "w")
     h.write('# Dimensions\n')
-    for i in (array.shape):
+    for i in (shape):
         h.write("%d " % i)
     h.write('\n')
     h.close()
+
+
+def writecfl(name, array):
+    writecfl_header(name, array.shape)
     d = open(name + ".cfl", "w")
     array.T.astype(np.complex64).tofile(d)  # tranpose for column-major order
     d.close()
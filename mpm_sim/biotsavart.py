@@ -0,0 +1,139 @@
+import logging
+
+import lxml.etree as et
+import numpy as np
+from scipy.special import ellipe, ellipk
+
+from mpm_sim.utils import *
+from mpm_sim.sensmap import register_coil, write_coil_map
+
+
+SLAB_SIZE = 16
+
+
+LOOP_DEFAULTS = dict(Azimuth=0., Polar=0., XPos=0., YPos=0., ZPos=0., Dim=3., Scale=1., Phase=0.)
+
+
+def load_loop_coils(geometry_xml_path: Path) -> list:
+    """Return the loop coils (attributes as dict of floats) defined by BIOTSAVARTLOOP elements of a coil array file.
+
+    Missing attributes get the Jemris defaults. Extent and Points are None if not specified, since Jemris then does
+    not grid the field.
+    """
+    parser = et.XMLParser(remove_blank_text=True)
+    coil_array = et.parse(str(geometry_xml_path), parser).getroot()
+    coils = []
+    for coil in coil_array:
+        if coil.tag != 'BIOTSAVARTLOOP':
+            logging.warning(f"Skip coil of type {coil.tag}. Only BIOTSAVARTLOOP coils can be synthesized.")
+            continue
+        if coil.get('Radius') is None:
+            raise ValueError(f"Loop coil {coil.get('Name')} in {geometry_xml_path} has no Radius.")
+        loop = {key: float(coil.get(key, default)) for key, default in LOOP_DEFAULTS.items()}
+        loop['Radius'] = float(coil.get('Radius'))
+        for key in ('Extent', 'Points'):
+            loop[key] = float(coil.get(key)) if coil.get(key) is not None else None
+        loop['Name'] = coil.get('Name')
+        coils.append(loop)
+    return coils
+
+
+def loop_normal(polar: float, azimuth: float) -> np.ndarray:
+    """Unit normal of a loop, given by its polar and azimuth angle in degrees."""
+    polar, azimuth = np.deg2rad(polar), np.deg2rad(azimuth)
+    return np.array([np.sin(polar) * np.cos(azimuth), np.sin(polar) * np.sin(azimuth), np.cos(polar)])
+
+
+def biot_savart_loop(points: np.ndarray, center: np.ndarray, normal: np.ndarray, radius: float) -> np.ndarray:
+    """Magnetic field of a circular current loop using the closed form solution with complete elliptic integrals.
+
+    The field is scaled such that it is 1 in the center of the loop. On the wire itself the field is singular and set
+    to 0.
+
+    :param points: positions of shape (N, 3)
+    :param center: center of the loop
+    :param normal: unit normal of the loop
+    :param radius: radius of the loop
+    :return: field vectors of shape (N, 3)
+    """
+    d = points - center
+    z = d @ normal
+    rho_vec = d - z[:, np.newaxis] * normal
+    rho = np.linalg.norm(rho_vec, axis=1)
+    r2 = rho ** 2 + z ** 2
+    a2 = radius ** 2
+
+    alpha2 = a2 + r2 - 2 * radius * rho
+    beta2 = a2 + r2 + 2 * radius * rho
+    on_wire = alpha2 <= np.finfo(float).eps * a2
+    alpha2[on_wire] = 1
+    beta = np.sqrt(beta2)
+    m = 1 - alpha2 / beta2
+    k, e = ellipk(m), ellipe(m)
+
+    # mu0 * I / pi is absorbed into the normalization: the field in the loop center is mu0 * I / (2 * radius)
+    scale = radius / np.pi
+    b_z = scale / (alpha2 * beta) * ((a2 - r2) * e + alpha2 * k)
+    b_rho = np.divide(scale * z / (alpha2 * beta) * ((a2 + r2) * e - alpha2 * k), rho,
+                      out=np.zeros_like(rho), where=rho > 0)
+    b_z[on_wire] = 0
+    b_rho[on_wire] = 0
+
+    rho_hat = np.divide(rho_vec, rho[:, np.newaxis], out=np.zeros_like(rho_vec), where=rho[:, np.newaxis] > 0)
+    return b_z[:, np.newaxis] * normal + b_rho[:, np.newaxis] * rho_hat
+
+
+def grid_axes(extent: float, points: int, dim: int) -> Tuple[np.ndarray, ...]:
+    """Coordinates of the (square) field grid along each axis, centered around the origin.
+
+    Like Jemris (Coil::GridMap), point i is at i * extent / points - extent / 2. For 2d grids, z is 0.
+    """
+    axis = (np.arange(points) - points / 2) * extent / points
+    return tuple(axis if d < dim else np.zeros(1) for d in range(3))
+
+
+def loop_sensitivity(coil: dict, axes: Tuple[np.ndarray, ...], slab_size: int = SLAB_SIZE) -> np.ndarray:
+    """Complex transverse field (Bx + iBy) of a loop coil on a grid, evaluated in slabs along z.
+
+    The field is multiplied by the Scale and rotated by the Phase (degrees) of the coil.
+    """
+    x, y, z = axes
+    center = np.array([coil['XPos'], coil['YPos'], coil['ZPos']])
+    normal = loop_normal(coil['Polar'], coil['Azimuth'])
+
+    sensitivity = np.empty((x.size, y.size, z.size), dtype=complex)
+    for start in range(0, z.size, slab_size):
+        slab = np.stack(np.meshgrid(x, y, z[start:start + slab_size], indexing='ij'), axis=-1)
+        field = biot_savart_loop(slab.reshape(-1, 3), center, normal, coil['Radius'])
+        sensitivity[..., start:start + slab_size] = (field[:, 0] + 1j * field[:, 1]).reshape(slab.shape[:-1])
+    return coil['Scale'] * np.exp(1j * np.deg2rad(coil['Phase'])) * sensitivity
+
+
+def loop_sensmaps(geometry_xml_path: Path, coil_xml_path: Path, overwrite: bool = False,
+                  extent: Union[float, None] = None, points: Union[int, None] = None, dim: Union[int, None] = None,
+                  slab_size: int = SLAB_SIZE, preview: int = 1):
+    """Synthesize sensitivity maps of the loop coils in a coil array file and register them as external coils.
+
+    The maps are written like the ones imported by sensmap. Grid extent, points and dimension are taken from each
+    loop unless they are overridden, e.g. to match the grid of the resampled sample. For a preview, the number of
+    points is reduced by the preview factor, keeping the extent.
+    """
+    coils = load_loop_coils(geometry_xml_path)
+    if not coils:
+        raise ValueError(f'No BIOTSAVARTLOOP coils defined in {geometry_xml_path}.')
+
+    for i, coil in enumerate(coils):
+        for key, override in (('Extent', extent), ('Points', points)):
+            if coil[key] is None and override is None:
+                raise ValueError(f"Loop coil {coil['Name']} has no {key}. Specify it in {geometry_xml_path} "
+                                 f"or pass {key.lower()} explicitly.")
+        coil_extent = coil['Extent'] if extent is None else extent
+        coil_points = max(int(coil['Points'] if points is None else points) // preview, 1)
+        coil_dim = int(coil['Dim'] if dim is None else dim)
+
+        logging.info(f"Synthesize field of loop coil {coil['Name']} ({i + 1}/{len(coils)})...")
+        sensitivity = loop_sensitivity(coil, grid_axes(coil_extent, coil_points, coil_dim), slab_size).squeeze()
+
+        map_path = register_coil(coil_xml_path, extent=coil_extent, points=coil_points, dim=coil_dim,
+                                 overwrite=overwrite and i == 0)
+        write_coil_map(map_path, np.absolute(sensitivity), np.angle(sensitivity))
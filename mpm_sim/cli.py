@@ -1,7 +1,9 @@
 import logging
 
 from mpm_sim.utils import *
-from mpm_sim.kspace import write_kspace
+from mpm_sim.kspace import write_kspace, KSPACE_THREADS
+from mpm_sim.biotsavart import SLAB_SIZE
+from mpm_sim.compression import compress_kspace
 from mpm_sim.simulation import Simulation
 
 
@@ -33,12 +35,25 @@ def init(**kwargs):
     simu.prepare_sample(segmentation_path, **kwargs)
 
 
+@cli.command(help="Reduce Nx/Ny/Nz of the sequence to match a preview sample (mpm-sim init --preview).",
+             context_settings={'show_default': True})
+@click.argument('sim_dir_path', type=click.Path())
+@click.option('-p', '--preview', metavar='PREVIEW_FACTOR', type=click.IntRange(min=1), required=True,
+              help='preview factor used for the sample (1 restores the full resolution sequence)')
+def preview_sequence(**kwargs):
+    simu = Simulation(kwargs['sim_dir_path'])
+    simu.simulation_directory.preview_sequence(kwargs['preview'])
+
+
 @cli.command(help="Sort samples of a fully sampled FLASH sequence into their corresponding kspace.",
              context_settings={'show_default': True})
 @click.argument('signals_path', metavar='SIG_PATH', type=click.Path())
 @click.option('--dims', metavar='DIMS', type=(int, int, int), default=(434, 352, 496),
               help='Dimensions for kspace ordering (default is a standard 0.5mm acquisition)')
 @click.option('--echoes', default=6, help='number of echoes to take into account', type=int)
+@click.option('--threads', default=KSPACE_THREADS, type=int,
+              help='number of channels processed in parallel (reading, sorting and writing overlap); '
+                   '1 processes all channels at once without a pipeline')
 def kspace(**kwargs):
     signals_path = kwargs.pop('signals_path')
     write_kspace(signals_path, **kwargs)
@@ -59,5 +74,58 @@ def prepare_rx_field(**kwargs):
     simu.prepare_rx_field(magnitude_map_path, phase_map_path, **kwargs)
 
 
+@cli.command(help="Synthesize receive or transmit fields of loop coils (BIOTSAVARTLOOP) with the Biot-Savart law.",
+             context_settings={'show_default': True})
+@click.argument('geometry_xml_path', type=click.Path())
+@click.argument('sim_dir_path', type=click.Path())
+@click.option('--field', type=click.Choice(['rx', 'tx']), default='rx', help='Prepare receive or transmit field.')
+@click.option('--overwrite/--no-overwrite', type=bool, help='Overwrite old coil xml file if it exists.', default=False)
+@click.option('--extent', metavar='EXTENT', type=float, default=None,
+              help='extent of the field grid in mm (default is the extent of each loop)')
+@click.option('--points', metavar='POINTS', type=int, default=None,
+              help='number of grid points on each axis (default is the number of points of each loop)')
+@click.option('--dim', metavar='DIM', type=click.IntRange(2, 3), default=None,
+              help='dimension of the field grid (default is the dimension of each loop)')
+@click.option('--slab-size', metavar='SLAB_SIZE', type=int, default=SLAB_SIZE,
+              help='number of z slices evaluated at once')
+@click.option('-p', '--preview', metavar='PREVIEW_FACTOR', type=click.IntRange(min=1), default=1,
+              help='coarse preview: reduce number of grid points by this factor')
+def prepare_loop_field(**kwargs):
+    geometry_xml_path = kwargs.pop('geometry_xml_path')
+    sim_dir_path = kwargs.pop('sim_dir_path')
+    field = kwargs.pop('field')
+
+    simu = Simulation(sim_dir_path)
+    if field == 'rx':
+        simu.prepare_rx_loops(geometry_xml_path, **kwargs)
+    else:
+        simu.prepare_tx_loops(geometry_xml_path, **kwargs)
+
+
+@cli.command(help="Compress the receive coil array into virtual coils (SVD coil compression).",
+             context_settings={'show_default': True})
+@click.argument('sim_dir_path', type=click.Path())
+@click.option('-k', '--coils', 'virtual_coils', metavar='COILS', type=int, required=True,
+              help='number of virtual coils')
+@click.option('--activate/--no-activate', type=bool, default=True,
+              help='Reference the compressed coil array as receive coil array in the simulation xml file.')
+def compress_rx_field(**kwargs):
+    sim_dir_path = kwargs.pop('sim_dir_path')
+    simu = Simulation(sim_dir_path)
+    simu.compress_rx_field(**kwargs)
+
+
+@cli.command(help="Compress the channels of a sorted kspace into virtual coils (SVD coil compression).",
+             context_settings={'show_default': True})
+@click.argument('kspace_path', metavar='KSPACE_PATH', type=click.Path())
+@click.option('-k', '--coils', 'virtual_coils', metavar='COILS', type=int, required=True,
+              help='number of virtual coils')
+@click.option('-m', '--matrix', 'compression_path', metavar='MATRIX_PATH', type=click.Path(), default=None,
+              help='HDF5 file with a stored compression matrix (calculated from the kspace if omitted)')
+def compress(**kwargs):
+    kspace_path = kwargs.pop('kspace_path')
+    compress_kspace(kspace_path, **kwargs)
+
+
 if __name__ == '__main__':
     cli()
@@ -0,0 +1,152 @@
+import logging
+
+import h5py
+import numpy as np
+
+from mpm_sim.utils import *
+from mpm_sim.bart.cfl import readcfl, writecfl
+from mpm_sim.sensmap import register_coil, write_coil_map, load_coil_map, load_coil_array
+
+
+def coil_compression(data: np.ndarray, virtual_coils: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Calculate an SVD (PCA) based coil compression matrix.
+
+    The right singular vectors of the data matrix (samples x channels) are obtained from the eigendecomposition of
+    the channel covariance matrix, which is much smaller than the data itself.
+
+    :param data: complex coil data with the channels in the last dimension
+    :param virtual_coils: number of virtual coils to keep
+    :return: Tuple: 1) compression matrix of shape (channels, virtual_coils), 2) fraction of the total energy
+             retained by each virtual coil
+    """
+    channels = data.shape[-1]
+    if not 0 < virtual_coils <= channels:
+        raise ValueError(f'Number of virtual coils must be between 1 and the number of channels ({channels}).')
+
+    samples = data.reshape(-1, channels)
+    covariance = samples.conj().T @ samples
+    eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+
+    # eigh sorts ascending, but we want the virtual coils with the most energy first
+    eigenvalues = np.clip(eigenvalues[::-1], 0, None)
+    eigenvectors = eigenvectors[:, ::-1]
+
+    if eigenvalues.sum() == 0:
+        raise ValueError('Coil data has no energy and cannot be compressed.')
+    energy = eigenvalues / eigenvalues.sum()
+    return eigenvectors[:, :virtual_coils], energy[:virtual_coils]
+
+
+def compress_coils(data: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """Combine the channels (last dimension) of data into virtual coils using the compression matrix."""
+    return data @ matrix
+
+
+def retained_energy(data: np.ndarray, compressed: np.ndarray) -> np.ndarray:
+    """Fraction of the total energy of data (channels in the last dimension) contained in each virtual coil."""
+    total = np.sum(np.absolute(data) ** 2)
+    if total == 0:
+        raise ValueError('Coil data has no energy.')
+    return np.sum(np.absolute(compressed.reshape(-1, compressed.shape[-1])) ** 2, axis=0) / total
+
+
+def log_energy(energy: np.ndarray) -> None:
+    """Report the energy retained per virtual coil."""
+    for coil, (coil_energy, cumulative_energy) in enumerate(zip(energy, np.cumsum(energy))):
+        logging.info(f'Virtual coil {coil}: {100 * coil_energy:.2f}% energy '
+                     f'({100 * cumulative_energy:.2f}% cumulative)')
+
+
+def write_compression(compression_path: Path, matrix: np.ndarray, energy: np.ndarray) -> None:
+    """Store compression matrix and retained energy as HDF5 file."""
+    logging.info(f'Writing compression matrix to HDF5 (location: {compression_path.absolute()})...')
+    with h5py.File(compression_path, 'w') as hf:
+        compression = hf.create_group('compression')
+        compression.create_dataset('matrix', data=matrix)
+        compression.create_dataset('energy', data=energy)
+
+
+def load_compression(compression_path: Path) -> Tuple[np.ndarray, np.ndarray]:
+    """Read compression matrix and retained energy written by write_compression."""
+    with h5py.File(compression_path, 'r') as hf:
+        return np.array(hf['compression']['matrix']), np.array(hf['compression']['energy'])
+
+
+def compress_sensmaps(coil_xml_path: Path, compressed_xml_path: Path, virtual_coils: int) -> np.ndarray:
+    """Compress the external coils of a coil array into virtual coils and write them as a new coil array.
+
+    Since the received signal is linear in the sensitivities, simulating the virtual coils gives the same result as
+    compressing the kspace of a simulation with all coils using the same matrix. The matrix is stored next to the new
+    coil array file as <name>_compression.h5.
+
+    :return: fraction of the total energy retained by each virtual coil
+    """
+    coils = load_coil_array(coil_xml_path)
+    if not coils:
+        raise ValueError(f'No external coils registered in {coil_xml_path}.')
+    geometry = {key: coils[0][key] for key in ('Dim', 'Points', 'Extent')}
+    if any({key: coil[key] for key in geometry} != geometry for coil in coils):
+        raise ValueError('All coils must share dimension, number of points and extent to be compressed.')
+
+    logging.info(f'Load {len(coils)} coil maps...')
+    sensitivities = []
+    for coil in coils:
+        magnitude, phase = load_coil_map(coil['Filename'])
+        sensitivities.append(magnitude * np.exp(1j * phase))
+    sensitivities = np.stack(sensitivities, axis=-1)
+
+    logging.info(f'Compress {len(coils)} coils into {virtual_coils} virtual coils...')
+    matrix, energy = coil_compression(sensitivities, virtual_coils)
+    log_energy(energy)
+    virtual_sensitivities = compress_coils(sensitivities, matrix)
+
+    write_compression(full_dir(compressed_xml_path) / f'{compressed_xml_path.stem}_compression.h5', matrix, energy)
+
+    logging.info(f'Write compressed coil XML file (location: {compressed_xml_path})...')
+    for coil in range(virtual_coils):
+        map_path = register_coil(compressed_xml_path, extent=float(geometry['Extent']), points=int(geometry['Points']),
+                                 dim=int(geometry['Dim']), overwrite=coil == 0)
+        sensitivity = virtual_sensitivities[..., coil]
+        write_coil_map(map_path, np.absolute(sensitivity), np.angle(sensitivity))
+
+    return energy
+
+
+def compress_kspace(kspace_path: Union[str, Path], virtual_coils: int,
+                    compression_path: Union[str, Path, None] = None) -> np.ndarray:
+    """Compress the channels of a sorted kspace (BART format) into virtual coils.
+
+    Without compression_path, the compression matrix is calculated from the kspace itself and stored as
+    <kspace>_compression.h5, otherwise the stored matrix (e.g. from compress_sensmaps) is applied. The result is
+    written next to the input as <kspace>_compressed.
+
+    :return: fraction of the total energy retained by each virtual coil
+    """
+    kspace_path = Path(kspace_path)
+    kspace = readcfl(str(kspace_path))
+
+    if compression_path is None:
+        logging.info(f'Compress {kspace.shape[-1]} channels into {virtual_coils} virtual coils...')
+        matrix, energy = coil_compression(kspace, virtual_coils)
+        write_compression(full_dir(kspace_path) / f'{kspace_path.name}_compression.h5', matrix, energy)
+    else:
+        matrix, _ = load_compression(Path(compression_path))
+        if matrix.shape[0] != kspace.shape[-1]:
+            raise ValueError(f'Compression matrix expects {matrix.shape[0]} channels, '
+                             f'but kspace has {kspace.shape[-1]}.')
+        if not 0 < virtual_coils <= matrix.shape[1]:
+            raise ValueError(f'Number of virtual coils must be between 1 and the number of virtual coils of the '
+                             f'stored compression matrix ({matrix.shape[1]}).')
+        logging.info(f'Compress {kspace.shape[-1]} channels into {virtual_coils} virtual coils '
+                     f'using the stored compression matrix...')
+        matrix = matrix[:, :virtual_coils]
+
+    compressed = compress_coils(kspace, matrix)
+    # the energy of a stored matrix refers to the data it was calculated from, so measure it on this kspace
+    energy = retained_energy(kspace, compressed)
+    log_energy(energy)
+
+    compressed_path = full_dir(kspace_path) / f'{kspace_path.name}_compressed'
+    logging.info(f'Writing compressed kspace to: {compressed_path}')
+    writecfl(str(compressed_path), compressed)
+    return energy
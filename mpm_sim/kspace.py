@@ -1,10 +1,15 @@
 import logging
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import h5py
 import numpy as np
 
 from mpm_sim.utils import *
-from mpm_sim.bart.cfl import writecfl
+from mpm_sim.bart.cfl import writecfl, writecfl_header
+
+
+KSPACE_THREADS = 4
 
 
 def load_h5_signal(signal_file: str) -> Tuple[np.ndarray, np.ndarray]:
@@ -21,7 +26,7 @@ def load_h5_signal(signal_file: str) -> Tuple[np.ndarray, np.ndarray]:
 
         sorting_time_indices = times.argsort(axis=0)
         magnetization_sorted_by_time = np.array(
-            [channels[i][sorting_time_indices] for i in channels]
+            [channels[i][()][sorting_time_indices] for i in channels]
         )
 
     return times[sorting_time_indices], magnetization_sorted_by_time
@@ -70,21 +75,124 @@ def flash_order_kspace(signals: np.ndarray, dimensions: Tuple[int, int, int], ec
     return order_kspace(signals=signals, dimensions=(z, echoes, y, x))
 
 
+def complexify_channel(channel: np.ndarray) -> np.ndarray:
+    """Vectorized version of complexify_signals for the magnetization time series of a single channel.
+
+    :param channel: magnetization time series of shape (no_time_points, 3)
+    :return: complex signal of shape (no_time_points, )
+    """
+    mxy = np.empty(channel.shape[0], dtype=complex)
+    mxy.real = channel[:, 1]
+    mxy.imag = channel[:, 0]
+    return mxy
+
+
+def flash_order_channel(channel: np.ndarray, dimensions: Tuple[int, int, int], echoes: int) -> np.ndarray:
+    """Sort the signal of a single channel into kspace, assuming a fully sampled FLASH sequence.
+
+    Odd echoes are read out in reverse and are flipped back. Returns ndarray of shape (z, echos, y, x).
+    """
+    x, y, z = dimensions
+    try:
+        kspace = np.reshape(complexify_channel(channel), (z, echoes, y, x), order='F')
+    except ValueError:
+        raise ValueError('Please make sure that your signal can be reshaped into the '
+                         'specified dimensions using this number of echos.')
+    kspace[:, 1::2] = np.flip(kspace[:, 1::2], axis=0)
+    return kspace
+
+
+def _read_channel(channel: h5py.Dataset, sorting_time_indices: np.ndarray) -> np.ndarray:
+    """Read the magnetization time series of a single channel and sort it by time."""
+    return channel[()][sorting_time_indices]
+
+
+def _order_channel(read: Future, dimensions: Tuple[int, int, int], echoes: int) -> np.ndarray:
+    """Wait for a channel to be read, then sort it into kspace."""
+    return flash_order_channel(read.result(), dimensions, echoes)
+
+
+def write_kspace_pipelined(signals_path: Union[str, Path], kspace_file_path: Union[str, Path],
+                           dimensions: Tuple[int, int, int], echoes: int,
+                           threads: int = KSPACE_THREADS) -> np.ndarray:
+    """Sort the signal of a fully sampled FLASH sequence into kspace channel by channel and write it in BART format.
+
+    Reading, sorting and writing overlap: while channel i is sorted into kspace, channel i+1 is read from the signal
+    file and channel i-1 is written to disk. Channels are the last (slowest) dimension of the column-major cfl file,
+    so they are appended one after another and the output is identical to writing the full kspace with writecfl.
+
+    :param signals_path: JEMRIS output
+    :param kspace_file_path: cfl/hdr file name without suffix
+    :param dimensions: dimensions for kspace ordering (x, y, z)
+    :param echoes: number of echoes
+    :param threads: number of threads sorting channels into kspace
+    :return: kspace of the first channel, shape (z, echos, y, x)
+    """
+    x, y, z = dimensions
+    kspace_file_path = str(kspace_file_path)
+    depth = max(threads, 1) + 1  # number of channels in flight
+    first_channel = None
+
+    with h5py.File(signals_path, 'r') as f, \
+            ThreadPoolExecutor(max_workers=1) as reader, \
+            ThreadPoolExecutor(max_workers=max(threads, 1)) as workers:
+        channels = f['signal']['channels']
+        sorting_time_indices = np.array(f['signal']['times']).argsort(axis=0)
+        names = iter(list(channels))
+        kspace_shape = (z, echoes, y, x, len(channels))
+        pending = deque()
+
+        def submit_next() -> None:
+            name = next(names, None)
+            if name is not None:
+                read = reader.submit(_read_channel, channels[name], sorting_time_indices)
+                pending.append(workers.submit(_order_channel, read, dimensions, echoes))
+
+        for _ in range(depth):
+            submit_next()
+
+        writecfl_header(kspace_file_path, kspace_shape)
+        try:
+            with open(kspace_file_path + ".cfl", "w") as d:
+                while pending:
+                    kspace = pending.popleft().result()
+                    submit_next()
+                    kspace.T.astype(np.complex64).tofile(d)  # tranpose for column-major order
+                    if first_channel is None:
+                        first_channel = kspace
+        except BaseException:
+            # do not leave a partial kspace behind
+            for future in pending:
+                future.cancel()
+            for suffix in (".cfl", ".hdr"):
+                Path(kspace_file_path + suffix).unlink(missing_ok=True)
+            raise
+
+    logging.info(f"Shape of kspace data: {kspace_shape}")
+    return first_channel
+
+
 def write_kspace(signals_path, **kwargs):
+    kwargs = check_defaults(kwargs, {'plot': False, 'threads': KSPACE_THREADS})
     dims = kwargs['dims']
     echoes = kwargs['echoes']
     plot = kwargs['plot']
-
-    _, signal = load_h5_signal(signals_path)
-    kspace = flash_order_kspace(signal, dimensions=dims, echoes=echoes)
-    for echo in range(echoes):
-        if echo % 2 == 1:
-            kspace[:, echo, :, :, :] = np.flip(kspace[:, echo, :, :, :], axis=0)
-
-    kspace_file_path = full_dir(signals_path) / "kspace"
-    logging.info("Writing kspace to: ", kspace_file_path)
-    logging.info("Shape of kspace data: ", kspace.shape)
-    writecfl(kspace_file_path, kspace)
+    threads = kwargs['threads']
+
+    kspace_file_path = full_dir(Path(signals_path)) / "kspace"
+    logging.info(f"Writing kspace to: {kspace_file_path}")
+
+    if threads > 1:
+        kspace = write_kspace_pipelined(signals_path, kspace_file_path, dims, echoes, threads)[..., np.newaxis]
+    else:
+        _, signal = load_h5_signal(signals_path)
+        kspace = flash_order_kspace(signal, dimensions=dims, echoes=echoes)
+        for echo in range(echoes):
+            if echo % 2 == 1:
+                kspace[:, echo, :, :, :] = np.flip(kspace[:, echo, :, :, :], axis=0)
+
+        logging.info(f"Shape of kspace data: {kspace.shape}")
+        writecfl(str(kspace_file_path), kspace)
 
     if plot:
         idx_plot_channel = 0
@@ -72,8 +72,8 @@ def sample_to_jemris(data: np.ndarray, off_resonance: Union[np.ndarray, None] =
     return jemris_sample
 
 
-def prepare_mpm(segmentation_path: str, **kwargs) -> ndarray:
-    """Prepare a multi-parametric map for simulation based on a tissue map (segmentation)."""
+def resample_segmentation(segmentation_path: str, **kwargs) -> ndarray:
+    """Load a tissue map (segmentation) and slice, transpose and interpolate it for simulation."""
 
     data, header = load_nifti(segmentation_path)
 
@@ -92,10 +92,31 @@ def prepare_mpm(segmentation_path: str, **kwargs) -> ndarray:
 
     logging.info("Resample segmentation data...")
     slices = get_slicing(args)
-    transformed_segmentation = resample_simulation_volume(data, slices, args['transpose'], args['interpolation'])
+    return resample_simulation_volume(data, slices, args['transpose'], args['interpolation'])
+
+
+def preview_segmentation(segmentation: ndarray, **kwargs) -> Tuple[ndarray, Tuple[float, ...]]:
+    """Downsample a resampled segmentation for a coarse preview by majority vote over the tissue labels.
+
+    :return: Tuple: 1) downsampled segmentation, 2) resolution of the downsampled segmentation
+    """
+    args = check_array_defaults(kwargs)
+    factors = preview_factors(segmentation.shape, args['preview'])
+    logging.info(f"Downsample segmentation by {factors} for preview...")
+    return majority_downsample(segmentation, factors), preview_resolution(args['resolution'], factors)
+
+
+def prepare_mpm(segmentation_path: str, **kwargs) -> ndarray:
+    """Prepare a multi-parametric map for simulation based on a tissue map (segmentation).
+
+    For a coarse preview, downsample the output of resample_segmentation with preview_segmentation instead, which
+    also returns the matching resolution.
+    """
+
+    segmentation = resample_segmentation(segmentation_path, **kwargs)
 
     logging.info("Calculate multi-parametric maps...")
-    return lookup_mpm(transformed_segmentation)
+    return lookup_mpm(segmentation)
 
 
 def write_sample(mpm_data: ndarray, sample_file: Path, **kwargs) -> bool:
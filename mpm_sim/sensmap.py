@@ -2,6 +2,7 @@ import logging
 
 import lxml.etree as et
 import h5py
+import numpy as np
 
 from mpm_sim.utils import *
 
@@ -55,18 +56,51 @@ def sensmap(coil_xml_path: Path, magmap: str, phasemap: str, **kwargs):
     data_magmap = resample_simulation_volume(load_nifti(magmap)[0], slices, kwargs['transpose'], BIAS_INTERPOLATION)
     data_phasemap = resample_simulation_volume(load_nifti(phasemap)[0], slices, kwargs['transpose'], BIAS_INTERPOLATION)
 
+    assert data_magmap.shape == data_phasemap.shape
+    resolution = kwargs['resolution']
+
+    if kwargs['preview'] > 1:
+        # average the complex field, so phase wraps do not distort the coarse map
+        factors = preview_factors(data_magmap.shape, kwargs['preview'])
+        logging.info(f'Downsample maps by {factors} for preview...')
+        data_field = mean_downsample(data_magmap * np.exp(1j * data_phasemap), factors)
+        data_magmap, data_phasemap = np.absolute(data_field), np.angle(data_field)
+        resolution = max(preview_resolution(resolution, factors))
+
     data_magmap = data_magmap.squeeze()
     data_phasemap = data_phasemap.squeeze()
-    assert data_magmap.shape == data_phasemap.shape
 
     logging.info(f'Write coil XML file (location: {coil_xml_path})...')
     dims = len(data_magmap.shape)
     num_points = max(data_magmap.shape)  # Jemris treats the fields as if they were square shaped
-    extent = num_points * kwargs['resolution']
+    extent = num_points * resolution
     map_path = register_coil(coil_xml_path, extent=extent, points=num_points, dim=dims, overwrite=kwargs['overwrite'])
 
+    write_coil_map(map_path, data_magmap, data_phasemap)
+
+
+def write_coil_map(map_path: Path, magnitude: ndarray, phase: ndarray):
+    """Write magnitude and phase of a coil field to HDF5 in the layout Jemris expects for external coils."""
     logging.info(f'Writing maps to HDF5 (location: {map_path.absolute()})...')
     with h5py.File(map_path, 'w') as hf:
         maps = hf.create_group('maps')
-        maps.create_dataset('magnitude', data=data_magmap.transpose())
-        maps.create_dataset('phase', data=data_phasemap.transpose())
+        maps.create_dataset('magnitude', data=magnitude.transpose())
+        maps.create_dataset('phase', data=phase.transpose())
+
+
+def load_coil_map(map_path: Path) -> Tuple[ndarray, ndarray]:
+    """Read magnitude and phase of a coil field written by write_coil_map."""
+    with h5py.File(map_path, 'r') as hf:
+        return np.array(hf['maps']['magnitude']).transpose(), np.array(hf['maps']['phase']).transpose()
+
+
+def load_coil_array(coil_xml_path: Path) -> list:
+    """Return the external coils (map attributes as dict) registered in a coil array file."""
+    parser = et.XMLParser(remove_blank_text=True)
+    coil_array = et.parse(str(coil_xml_path), parser).getroot()
+    coils = []
+    for external_coil in coil_array.iter('EXTERNALCOIL'):
+        coil = dict(external_coil.attrib)
+        coil['Filename'] = full_dir(coil_xml_path) / Path(coil['Filename'])  # no-op for absolute paths
+        coils.append(coil)
+    return coils
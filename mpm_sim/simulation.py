@@ -1,7 +1,12 @@
+import copy
+import shutil
+
 import lxml.etree as xml_etree
 
 from mpm_sim.sample import *
 from mpm_sim.sensmap import *
+from mpm_sim.compression import compress_sensmaps
+from mpm_sim.biotsavart import loop_sensmaps
 from mpm_sim.utils import *
 
 
@@ -21,9 +26,12 @@ class SimulationDirectory:
         SIMU_FILE='jemris_simulation.xml',
         SAMPLE_FILE='jemris_sample.h5',
         SEQUENCE_FILE='jemris_sequence.xml',
+        SEQUENCE_FULL_FILE='jemris_sequence.xml.full',
         RX_FILE='jemris_RX.xml',
+        RX_COMPRESSED_FILE='jemris_RX_compressed.xml',
         TX_FILE='jemris_TX.xml'
     )
+    sequence_samples = ('Nx', 'Ny', 'Nz')
 
     def __init__(self, sim_dir_path: Union[str, Path]):
         sim_dir_path = Path(sim_dir_path).absolute()
@@ -90,6 +98,72 @@ class SimulationDirectory:
         with self.paths['SIMU_FILE'].open(mode='wb') as xml:
             xml.write(xml_string)
 
+    def set_rx_coilarray(self, coil_xml_path: Path):
+        rx_coilarray = self.simulate.find('RXcoilarray')
+        rx_coilarray.set('uri', str(coil_xml_path.absolute()))
+        self.dump_simu_xml()
+
+    def preview_sequence(self, factor: int):
+        """Reduce the number of samples (Nx, Ny, Nz) of the sequence by factor, keeping the field of view.
+
+        Singleton dimensions are kept, just like for the preview sample. The full resolution sequence is kept as
+        jemris_sequence.xml.full and the preview is always derived from it, so repeated calls do not shrink the
+        sequence any further. A factor of 1 restores the full resolution. A newly copied sequence replaces the
+        backup, but an edited preview is left untouched, since it would replace the backup with a reduced sequence.
+        """
+        sequence_file = self.paths['SEQUENCE_FILE']
+        full_sequence_file = self.paths['SEQUENCE_FULL_FILE']
+        if not sequence_file.exists():
+            logging.warning(f"No sequence file at {str(sequence_file)}. After copying one, run "
+                            f"mpm-sim preview-sequence -p {factor} to match the preview sample.")
+            return
+        sequence = xml_etree.parse(str(sequence_file))
+        parameters = sequence.getroot()
+
+        full_parameters = None
+        if full_sequence_file.exists():
+            full_parameters = xml_etree.parse(str(full_sequence_file)).getroot()
+            if not SimulationDirectory._is_preview_of(parameters, full_parameters):
+                if SimulationDirectory._is_reduction_of(parameters, full_parameters):
+                    # the sequence is an edited preview, so it must not replace the only full resolution copy
+                    logging.warning(f"The preview sequence {str(sequence_file)} was edited. Sequence not adjusted. "
+                                    f"Apply your changes to the full resolution backup {str(full_sequence_file)} "
+                                    f"and run mpm-sim preview-sequence again.")
+                    return
+                logging.info(f"Sequence differs from the full resolution backup, replace backup: "
+                             f"{str(full_sequence_file)}")
+                full_parameters = None
+        if full_parameters is None:
+            shutil.copyfile(sequence_file, full_sequence_file)
+            full_parameters = xml_etree.parse(str(full_sequence_file)).getroot()
+
+        for key in SimulationDirectory.sequence_samples:
+            samples = int(full_parameters.get(key, 1))
+            if samples > 1:
+                parameters.set(key, str(max(samples // factor, 1)))
+        samples = tuple(parameters.get(key, '1') for key in SimulationDirectory.sequence_samples)
+        logging.info(f"Write preview sequence with Nx={samples[0]}, Ny={samples[1]}, Nz={samples[2]}: "
+                     f"{str(sequence_file)}")
+        logging.info(f"Sort the simulated signal with: mpm-sim kspace --dims {' '.join(samples)}")
+        sequence.write(str(sequence_file), encoding='utf-8', xml_declaration=True)
+
+    @staticmethod
+    def _is_preview_of(parameters, full_parameters) -> bool:
+        """Check whether a sequence only differs from the full resolution sequence in its number of samples."""
+        parameters = copy.deepcopy(parameters)
+        for key in SimulationDirectory.sequence_samples:
+            if key in full_parameters.attrib:
+                parameters.set(key, full_parameters.get(key))
+        return xml_etree.tostring(parameters) == xml_etree.tostring(full_parameters)
+
+    @staticmethod
+    def _is_reduction_of(parameters, full_parameters) -> bool:
+        """Check whether the number of samples of a sequence are those of a preview (factor > 1) of the full sequence."""
+        full_samples = [int(full_parameters.get(key, 1)) for key in SimulationDirectory.sequence_samples]
+        samples = [int(parameters.get(key, 1)) for key in SimulationDirectory.sequence_samples]
+        return any(samples == [max(n // factor, 1) if n > 1 else n for n in full_samples]
+                   for factor in range(2, max(full_samples) + 1))
+
     def get_root(self):
         return self.paths['ROOT_DIR']
 
@@ -102,7 +176,17 @@ class Simulation:
         """Use a brain tissue map (segmentation) in nifti format as a template for a JEMRIS sample and write to disk."""
 
         logging.info("Resample volume and lookup values for multi-parametric map.")
-        mpm_data = prepare_mpm(segmentation_path, **kwargs)
+        segmentation = resample_segmentation(segmentation_path, **kwargs)
+
+        kwargs = check_array_defaults(kwargs)
+        if kwargs['preview'] > 1:
+            segmentation, kwargs['resolution'] = preview_segmentation(segmentation, **kwargs)
+        if kwargs['preview'] > 1 or self.simulation_directory.paths['SEQUENCE_FULL_FILE'].exists():
+            # a full resolution run after a preview restores the full resolution sequence
+            self.simulation_directory.preview_sequence(kwargs['preview'])
+
+        logging.info("Calculate multi-parametric maps...")
+        mpm_data = lookup_mpm(segmentation)
 
         logging.info("Write sample to disc in HDF5 format...")
         return write_sample(mpm_data, self.simulation_directory.paths['SAMPLE_FILE'], **kwargs)
@@ -114,3 +198,20 @@ class Simulation:
     def prepare_tx_field(self, magmap: str, phasemap: str, **kwargs):
         coil_xml_path = self.simulation_directory.paths['TX_FILE']
         return sensmap(coil_xml_path, magmap, phasemap, **kwargs)
+
+    def prepare_rx_loops(self, geometry_xml_path: Union[str, Path], **kwargs):
+        coil_xml_path = self.simulation_directory.paths['RX_FILE']
+        return loop_sensmaps(Path(geometry_xml_path), coil_xml_path, **kwargs)
+
+    def prepare_tx_loops(self, geometry_xml_path: Union[str, Path], **kwargs):
+        coil_xml_path = self.simulation_directory.paths['TX_FILE']
+        return loop_sensmaps(Path(geometry_xml_path), coil_xml_path, **kwargs)
+
+    def compress_rx_field(self, virtual_coils: int, activate: bool = True):
+        """Compress the receive coil array into virtual coils and optionally simulate with the compressed array."""
+        paths = self.simulation_directory.paths
+        energy = compress_sensmaps(paths['RX_FILE'], paths['RX_COMPRESSED_FILE'], virtual_coils)
+        if activate:
+            logging.info(f"Use compressed receive coil array for simulation: {paths['RX_COMPRESSED_FILE']}")
+            self.simulation_directory.set_rx_coilarray(paths['RX_COMPRESSED_FILE'])
+        return energy
@@ -1,4 +1,7 @@
+import logging
+
 import matplotlib.pyplot as plt
+import numpy as np
 from numpy import ndarray
 import nibabel as nib
 from typing import Tuple, Union
@@ -18,6 +21,7 @@ ARRAY_DEFAULTS = dict(
     transpose=(0, 2, 1),
     resolution=0.5,
     offset=0,
+    preview=1,
 )
 
 SAMPLE_OPTIONS = [
@@ -32,10 +36,13 @@ SAMPLE_OPTIONS = [
                  help='slicing in z direction', default=ARRAY_DEFAULTS['zslice']),
     click.option('-t', '--transpose', metavar='TRANSPOSE', type=(int, int, int),
                  help='transpose array dimensions', default=ARRAY_DEFAULTS['transpose']),
-    click.option('-r', '--resolution', metavar='RESOLUTION', type=int,
-                 help='transpose array dimensions', default=ARRAY_DEFAULTS['resolution']),
+    click.option('-r', '--resolution', metavar='RESOLUTION', type=float,
+                 help='distance between spins in mm', default=ARRAY_DEFAULTS['resolution']),
     click.option('-o', '--offset', metavar='OFFSET', type=int,
                  help='transpose array dimensions', default=ARRAY_DEFAULTS['offset']),
+    click.option('-p', '--preview', metavar='PREVIEW_FACTOR', type=click.IntRange(min=1),
+                 help='coarse preview: reduce number of spins by this factor on each (non-singleton) axis '
+                      'after interpolation', default=ARRAY_DEFAULTS['preview']),
 ]
 
 
@@ -94,6 +101,59 @@ def resample_simulation_volume(
     return template
 
 
+def preview_factors(shape: Tuple[int, ...], factor: int) -> Tuple[int, ...]:
+    """Downsampling factor for each axis of a volume.
+
+    Singleton axes (e.g. of a single slice) are kept and axes shorter than factor are reduced to a single voxel.
+    """
+    factors = tuple(min(factor, n) if n > 1 else 1 for n in shape)
+    if any(1 < n < factor for n in shape):
+        logging.warning(f"Volume of shape {shape} is thinner than the preview factor {factor} along some axes. "
+                        f"Downsampling by {factors} instead.")
+    return factors
+
+
+def preview_resolution(resolution: Union[float, Tuple[float, ...]], factors: Tuple[int, ...]) -> Tuple[float, ...]:
+    """Resolution of a volume after downsampling by factors."""
+    if isinstance(resolution, (float, int)):
+        resolution = tuple(resolution for _ in factors)
+    return tuple(r * f for r, f in zip(resolution, factors))
+
+
+def block_view(data: ndarray, factors: Tuple[int, ...]) -> ndarray:
+    """Rearrange a 3d array into blocks of shape factors, returning an array of shape (<number of blocks>, block size).
+
+    Voxels that do not fill a complete block are cropped evenly from both ends of each axis, so the center of the
+    volume is preserved.
+    """
+    crop = tuple(slice((n % f) // 2, (n % f) // 2 + n - n % f) for n, f in zip(data.shape, factors))
+    if any(n % f for n, f in zip(data.shape, factors)):
+        logging.warning(f"Volume of shape {data.shape} is not divisible by {factors}. Cropping to fit.")
+    data = data[crop]
+    blocks = tuple(n // f for n, f in zip(data.shape, factors))
+    data = data.reshape((blocks[0], factors[0], blocks[1], factors[1], blocks[2], factors[2]))
+    return data.transpose((0, 2, 4, 1, 3, 5)).reshape(blocks + (-1, ))
+
+
+def majority_downsample(labels: ndarray, factors: Tuple[int, ...]) -> ndarray:
+    """Downsample a 3d label volume (e.g. a segmentation) by assigning the most frequent label of each block.
+
+    Ties are resolved in favor of the smaller label.
+    """
+    blocks = block_view(labels.astype(int), factors)
+    shape, blocks = blocks.shape[:-1], blocks.reshape(-1, blocks.shape[-1])
+    offset = blocks.min()
+    n_labels = blocks.max() - offset + 1
+    index = (blocks - offset) + n_labels * np.arange(blocks.shape[0])[:, np.newaxis]
+    counts = np.bincount(index.ravel(), minlength=blocks.shape[0] * n_labels).reshape(-1, n_labels)
+    return (counts.argmax(axis=1) + offset).reshape(shape)
+
+
+def mean_downsample(data: ndarray, factors: Tuple[int, ...]) -> ndarray:
+    """Downsample a 3d volume (e.g. a bias field) by averaging each block."""
+    return block_view(data, factors).mean(axis=-1)
+
+
 def full_dir(path: Path) -> Path:
     """Get full path of the containing directory"""
     return path.absolute().parent
@@ -0,0 +1,70 @@
+import pytest
+
+import numpy as np
+
+from mpm_sim.biotsavart import biot_savart_loop, grid_axes, loop_normal, loop_sensitivity, loop_sensmaps, \
+    load_loop_coils
+from mpm_sim.sensmap import load_coil_array, load_coil_map
+
+
+class TestBiotSavart:
+    def test_biot_savart_loop(self):
+        np.random.seed(0)
+        center, normal, radius = np.array([10., -5., 3.]), loop_normal(60, 30), 20.
+        points = center + 60 * (np.random.rand(50, 3) - 0.5)
+        field = biot_savart_loop(points, center, normal, radius)
+
+        # Numerical integration of the Biot-Savart law over the discretized loop
+        u = np.cross(normal, [1., 0., 0.])
+        u /= np.linalg.norm(u)
+        v = np.cross(normal, u)
+        phi = np.linspace(0, 2 * np.pi, 20000, endpoint=False)
+        wire = center + radius * (np.outer(np.cos(phi), u) + np.outer(np.sin(phi), v))
+        dl = radius * (2 * np.pi / phi.size) * (np.outer(-np.sin(phi), u) + np.outer(np.cos(phi), v))
+        r = points[:, np.newaxis] - wire
+        numeric = (np.cross(dl, r) / np.linalg.norm(r, axis=-1, keepdims=True) ** 3).sum(axis=1)
+        numeric *= radius / (2 * np.pi)  # same normalization: field is 1 in the loop center
+
+        assert np.allclose(biot_savart_loop(center[np.newaxis], center, normal, radius), normal)
+        assert np.allclose(field, numeric, rtol=1e-3, atol=1e-6)
+
+    def test_grid_axes(self):
+        x, y, z = grid_axes(256, 64, 2)
+        assert x[0] == -128 and x[32] == 0 and x[-1] == 124, "Grid does not match the Jemris convention."
+        assert np.array_equal(x, y) and np.array_equal(z, [0])
+
+    def test_loop_sensmaps(self, tmp_path):
+        coil_xml_path = tmp_path / 'jemris_RX.xml'
+        loop_sensmaps('examples/coils/coil_8chhead.xml', coil_xml_path, overwrite=True, points=16, slab_size=4)
+        coils = load_coil_array(coil_xml_path)
+        loops = load_loop_coils('examples/coils/coil_8chhead.xml')
+        assert len(coils) == len(loops)
+        for coil, loop in zip(coils, loops):
+            magnitude, phase = load_coil_map(coil['Filename'])
+            expected = loop_sensitivity(loop, grid_axes(256, 16, 2)).squeeze()
+            assert magnitude.shape == phase.shape == (16, 16)
+            assert np.allclose(magnitude * np.exp(1j * phase), expected), "Written map does not match the field."
+
+        loop_sensmaps('examples/coils/coil_8chhead.xml', coil_xml_path, overwrite=True, points=8, dim=3, slab_size=3)
+        magnitude, phase = load_coil_map(load_coil_array(coil_xml_path)[-1]['Filename'])
+        assert magnitude.shape == (8, 8, 8)
+        assert np.allclose(magnitude * np.exp(1j * phase), loop_sensitivity(loops[-1], grid_axes(256, 8, 3)))
+
+    def test_loop_attributes(self, tmp_path):
+        geometry_xml_path = tmp_path / 'coils.xml'
+        geometry_xml_path.write_text('<CoilArray>'
+                                     '<BIOTSAVARTLOOP Name="C1" Radius="100" Extent="256" Points="8" Dim="2"/>'
+                                     '<BIOTSAVARTLOOP Name="C2" Radius="100" Extent="256" Points="8" Dim="2" '
+                                     'Scale="2" Phase="90"/>'
+                                     '</CoilArray>')
+        plain, rotated = load_loop_coils(geometry_xml_path)
+        axes = grid_axes(256, 8, 2)
+        assert np.allclose(loop_sensitivity(rotated, axes), 2j * loop_sensitivity(plain, axes))
+
+        geometry_xml_path.write_text('<CoilArray><BIOTSAVARTLOOP Name="C1" Radius="100" Dim="2"/></CoilArray>')
+        with pytest.raises(ValueError, match='Extent'):
+            loop_sensmaps(geometry_xml_path, tmp_path / 'jemris_RX.xml')
+        loop_sensmaps(geometry_xml_path, tmp_path / 'jemris_RX.xml', extent=256, points=8)
+
+if __name__ == '__main__':
+    pytest.main(['-v'])
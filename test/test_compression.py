@@ -0,0 +1,76 @@
+import pytest
+
+import numpy as np
+
+from mpm_sim.bart.cfl import readcfl, writecfl
+from mpm_sim.compression import coil_compression, compress_coils, compress_sensmaps, compress_kspace, \
+    load_compression
+from mpm_sim.sensmap import register_coil, write_coil_map, load_coil_map, load_coil_array
+
+
+class TestCompression:
+    def test_coil_compression(self):
+        np.random.seed(0)
+        # 8 channels spanned by 3 independent coil profiles
+        profiles = np.random.randn(1000, 3) + 1j * np.random.randn(1000, 3)
+        data = profiles @ (np.random.randn(3, 8) + 1j * np.random.randn(3, 8))
+        matrix, energy = coil_compression(data, 3)
+        assert matrix.shape == (8, 3)
+        assert np.all(np.diff(energy) <= 0), "Virtual coils are not sorted by energy."
+        assert energy.sum() == pytest.approx(1)
+        compressed = compress_coils(data, matrix)
+        assert np.allclose(compressed @ matrix.conj().T, data), "Compressed data does not retain all energy."
+
+    def test_compress_sensmaps(self, tmp_path):
+        np.random.seed(0)
+        coil_xml_path = tmp_path / 'jemris_RX.xml'
+        magnitudes, phases = np.random.rand(4, 8, 8), np.random.rand(4, 8, 8)
+        for coil in range(4):
+            map_path = register_coil(coil_xml_path, extent=8., points=8, dim=2, overwrite=coil == 0)
+            write_coil_map(map_path, magnitudes[coil], phases[coil])
+        sensitivities = np.stack(magnitudes * np.exp(1j * phases), axis=-1)
+
+        compressed_xml_path = tmp_path / 'jemris_RX_compressed.xml'
+        energy = compress_sensmaps(coil_xml_path, compressed_xml_path, 2)
+        coils = load_coil_array(compressed_xml_path)
+        assert len(coils) == len(energy) == 2
+        compression_path = tmp_path / 'jemris_RX_compressed_compression.h5'
+        matrix, _ = load_compression(compression_path)
+        assert matrix.shape == (4, 2)
+
+        virtual_sensitivities = compress_coils(sensitivities, matrix)
+        for coil, virtual_coil in enumerate(coils):
+            magnitude, phase = load_coil_map(virtual_coil['Filename'])
+            assert np.allclose(magnitude * np.exp(1j * phase), virtual_sensitivities[..., coil]), \
+                "Virtual coil map does not match the compressed sensitivities."
+
+        # The signal is linear in the sensitivities: compressing the kspace of all coils with the stored matrix
+        # equals the kspace of the virtual coils.
+        magnetization = np.random.rand(8, 8)
+        kspace = np.fft.fft2(sensitivities * magnetization[..., np.newaxis], axes=(0, 1))
+        writecfl(str(tmp_path / 'kspace'), kspace)
+        compress_kspace(tmp_path / 'kspace', 2, compression_path)
+        virtual_kspace = np.fft.fft2(virtual_sensitivities * magnetization[..., np.newaxis], axes=(0, 1))
+        assert np.allclose(readcfl(str(tmp_path / 'kspace_compressed')), virtual_kspace, rtol=1e-4, atol=1e-4)
+
+    def test_coil_compression_without_energy(self):
+        with pytest.raises(ValueError):
+            coil_compression(np.zeros((10, 4), dtype=complex), 2)
+
+    def test_compress_kspace(self, tmp_path):
+        np.random.seed(0)
+        kspace = np.random.randn(2, 3, 4, 5, 6) + 1j * np.random.randn(2, 3, 4, 5, 6)
+        writecfl(str(tmp_path / 'kspace'), kspace)
+        energy = compress_kspace(tmp_path / 'kspace', 6)
+        assert energy.sum() == pytest.approx(1, rel=1e-5)
+
+        compression_path = tmp_path / 'kspace_compression.h5'
+        energy = compress_kspace(tmp_path / 'kspace', 2, compression_path)
+        assert energy.shape == (2, ) and energy.sum() < 1
+        for virtual_coils in (0, 7):
+            with pytest.raises(ValueError):
+                compress_kspace(tmp_path / 'kspace', virtual_coils, compression_path)
+
+
+if __name__ == '__main__':
+    pytest.main(['-v'])
@@ -1,8 +1,10 @@
 import pytest
 
+import h5py
+import numpy as np
 from numpy import absolute, fft, flip
 
-from mpm_sim.kspace import flash_order_kspace, load_h5_signal
+from mpm_sim.kspace import flash_order_kspace, load_h5_signal, write_kspace
 from mpm_sim.utils import plot_list, load_nifti
 from test.helper import TestHelper as Helper
 
@@ -17,6 +19,29 @@ class TestKspace:
             (absolute(fft.ifftshift(fft.ifft2(kspace))), "Recon")
         ])
 
+    def test_write_kspace_pipelined(self, tmp_path):
+        dims, echoes, channels = (3, 4, 2), 2, 5
+        times = np.random.permutation(np.prod(dims) * echoes).astype(float)
+        for run in ('serial', 'pipelined'):
+            (tmp_path / run).mkdir()
+            with h5py.File(tmp_path / run / 'signals.h5', 'w') as f:
+                f.create_dataset('signal/times', data=times)
+                for channel in range(channels):
+                    np.random.seed(channel)
+                    f.create_dataset(f'signal/channels/{channel:02}', data=np.random.randn(times.size, 3))
+
+        write_kspace(str(tmp_path / 'serial' / 'signals.h5'), dims=dims, echoes=echoes, threads=1)
+        write_kspace(str(tmp_path / 'pipelined' / 'signals.h5'), dims=dims, echoes=echoes, threads=3)
+        for suffix in ('.cfl', '.hdr'):
+            serial = (tmp_path / 'serial' / 'kspace').with_suffix(suffix).read_bytes()
+            pipelined = (tmp_path / 'pipelined' / 'kspace').with_suffix(suffix).read_bytes()
+            assert serial == pipelined, f"Pipelined kspace{suffix} differs from serial output."
+
+        with pytest.raises(ValueError):
+            write_kspace(str(tmp_path / 'pipelined' / 'signals.h5'), dims=(5, 4, 2), echoes=echoes, threads=3)
+        assert not (tmp_path / 'pipelined' / 'kspace.cfl').exists(), "Partial kspace was not removed."
+        assert not (tmp_path / 'pipelined' / 'kspace.hdr').exists(), "Stale kspace header was not removed."
+
 
 if __name__ == '__main__':
     pytest.main(['-v'])
@@ -1,9 +1,11 @@
 import pytest
 import logging
 
+import numpy as np
+
 from test.helper import TestHelper as Helper
 from mpm_sim.utils import plot_list
-from mpm_sim.sample import lookup_mpm
+from mpm_sim.sample import lookup_mpm, preview_segmentation
 from mpm_sim.utils import load_nifti
 
 
@@ -26,6 +28,21 @@ class TestSample:
         logging.info("Shape: ", mpm_data.shape, "; Size: ", mpm_data.size)
         assert mpm_data.shape == (x, y, z, 5), "Unexpected array shape."
 
+    def test_preview_segmentation(self):
+        seg_data = np.zeros((1, 6, 5), dtype=int)
+        seg_data[0, :2, :2] = [[2, 2], [3, 1]]  # majority
+        seg_data[0, 2:4, :2] = [[3, 2], [3, 2]]  # tie resolves to smaller label
+        seg_data[0, :, 4] = 9  # cropped
+        preview, resolution = preview_segmentation(seg_data, preview=2, resolution=0.5)
+        assert preview.shape == (1, 3, 2), "Unexpected array shape."
+        assert preview[0, 0, 0] == 2 and preview[0, 1, 0] == 2 and preview[0, 2, 0] == 0
+        assert resolution == (0.5, 1.0, 1.0)
+
+        # axes shorter than the preview factor are reduced to a single voxel
+        preview, resolution = preview_segmentation(np.ones((1, 3, 8)), preview=4, resolution=0.5)
+        assert preview.shape == (1, 1, 2) and np.all(preview == 1)
+        assert resolution == (0.5, 1.5, 2.0)
+
 
 if __name__ == '__main__':
     pytest.main(['-v'])
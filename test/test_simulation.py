@@ -0,0 +1,79 @@
+import pytest
+import shutil
+
+import lxml.etree as et
+import nibabel as nib
+import numpy as np
+from click.testing import CliRunner
+
+from mpm_sim.cli import cli
+from mpm_sim.simulation import Simulation, SimulationDirectory
+
+
+def sequence_samples(simulation_directory):
+    parameters = et.parse(str(simulation_directory.paths['SEQUENCE_FILE'])).getroot()
+    return tuple(parameters.get(key) for key in SimulationDirectory.sequence_samples)
+
+
+class TestSimulation:
+    def test_preview_sequence(self, tmp_path):
+        simulation_directory = SimulationDirectory(tmp_path / 'sim')
+        shutil.copy('examples/pdw/jemris_sequence.xml', simulation_directory.paths['SEQUENCE_FILE'])
+
+        simulation_directory.preview_sequence(2)
+        simulation_directory.preview_sequence(2)
+        assert sequence_samples(simulation_directory) == ('1', '176', '248'), "Preview is not idempotent."
+
+        simulation_directory.preview_sequence(1)
+        assert sequence_samples(simulation_directory) == ('1', '352', '496'), "Full resolution was not restored."
+
+        # a newly copied sequence replaces the full resolution backup
+        shutil.copy('examples/t1w/jemris_sequence.xml', simulation_directory.paths['SEQUENCE_FILE'])
+        full_samples = sequence_samples(simulation_directory)
+        simulation_directory.preview_sequence(4)
+        assert sequence_samples(simulation_directory) == tuple(
+            str(max(int(n) // 4, 1)) if int(n) > 1 else n for n in full_samples)
+
+    def test_preview_sequence_cli(self, tmp_path):
+        simulation_directory = SimulationDirectory(tmp_path / 'sim')
+        shutil.copy('examples/pdw/jemris_sequence.xml', simulation_directory.paths['SEQUENCE_FILE'])
+        runner = CliRunner()
+
+        result = runner.invoke(cli, ['preview-sequence', '-p', '2', str(tmp_path / 'sim')])
+        assert result.exit_code == 0, result.output
+        assert sequence_samples(simulation_directory) == ('1', '176', '248')
+
+        result = runner.invoke(cli, ['preview-sequence', '-p', '1', str(tmp_path / 'sim')])
+        assert result.exit_code == 0, result.output
+        assert sequence_samples(simulation_directory) == ('1', '352', '496'), "Full resolution was not restored."
+
+    def test_prepare_sample_restores_sequence(self, tmp_path):
+        segmentation_path = str(tmp_path / 'segmentation.nii')
+        nib.save(nib.Nifti1Image(np.ones((1, 8, 8)), np.eye(4)), segmentation_path)
+        simu = Simulation(tmp_path / 'sim')
+        simulation_directory = simu.simulation_directory
+        shutil.copy('examples/pdw/jemris_sequence.xml', simulation_directory.paths['SEQUENCE_FILE'])
+
+        simu.prepare_sample(segmentation_path, preview=2)
+        assert sequence_samples(simulation_directory) == ('1', '176', '248')
+        simu.prepare_sample(segmentation_path)
+        assert sequence_samples(simulation_directory) == ('1', '352', '496'), "Full run kept the preview sequence."
+
+    def test_preview_sequence_keeps_backup_of_edited_preview(self, tmp_path):
+        simulation_directory = SimulationDirectory(tmp_path / 'sim')
+        sequence_file = simulation_directory.paths['SEQUENCE_FILE']
+        shutil.copy('examples/pdw/jemris_sequence.xml', sequence_file)
+        simulation_directory.preview_sequence(2)
+
+        sequence = et.parse(str(sequence_file))
+        sequence.getroot().set('TR', '30')
+        sequence.write(str(sequence_file))
+        simulation_directory.preview_sequence(2)
+        simulation_directory.preview_sequence(1)
+        assert sequence_samples(simulation_directory) == ('1', '176', '248'), "Edited preview was modified."
+        full_parameters = et.parse(str(simulation_directory.paths['SEQUENCE_FULL_FILE'])).getroot()
+        assert (full_parameters.get('Ny'), full_parameters.get('Nz')) == ('352', '496'), "Backup was overwritten."
+
+
+if __name__ == '__main__':
+    pytest.main(['-v'])